@@ -0,0 +1,146 @@
+__author__ = 'Vincent van Bergen'
+
+import functools
+import multiprocessing
+import random
+
+import simpy
+
+from machine_simulation.simulation import ComponentStock, BreakableComponent, Module, Factory
+from machine_simulation.input import (CA, CB, CAB, CD, CHA, CHB, CHAB, LA, LB, LAB, MA, MB, SA, SB, SAB, TRA, TRB, TRAB,
+                                      NUMBER_MACHINES, NUMBER_MAINTENANCE_MEN, SIMULATION_TIME, OPERATOR_SALARY,
+                                      MAINTENANCE_MAN_SALARY)
+
+DEFAULT_PARAMETERS = {
+    'replace_module_a': False,  # whether to replace the module when part A breaks
+    'replace_module_b': False,  # whether to replace the module when part B breaks
+    'number_maintenance_men': NUMBER_MAINTENANCE_MEN,
+    'number_machines': NUMBER_MACHINES,
+    'simulation_time': SIMULATION_TIME,
+}
+
+POLICIES = {
+    'o': {'replace_module_a': False, 'replace_module_b': False},  # always replace the broken part
+    'a': {'replace_module_a': True, 'replace_module_b': False},  # replace the module when part A breaks
+    'b': {'replace_module_a': False, 'replace_module_b': True},  # replace the module when part B breaks
+    'c': {'replace_module_a': True, 'replace_module_b': True},  # always replace the module
+}
+
+COSTS = ('costs', 'downtime_costs', 'purchase_costs', 'inventory_holding_costs', 'salary_costs')
+
+
+def build_factory(env, parameters):
+    """
+    Builds a factory whose machines consist of a module with part A and part B, using the constants of input
+    :param env: simulation environment
+    :param parameters: dict with the keys of DEFAULT_PARAMETERS
+    :return: Factory
+    """
+    breakable_components = [
+        BreakableComponent(env, "Part A", TRA, ComponentStock(env, CA, LA, CHA, SA), MA,
+                           parameters['replace_module_a']),
+        BreakableComponent(env, "Part B", TRB, ComponentStock(env, CB, LB, CHB, SB), MB,
+                           parameters['replace_module_b']),
+    ]
+    module = Module(env, TRAB, ComponentStock(env, CAB, LAB, CHAB, SAB), breakable_components)
+    return Factory(env, parameters['number_maintenance_men'], module, CD, parameters['number_machines'],
+                   OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
+
+
+def run_one(seed, parameters=None):
+    """
+    Runs a single replication of the simulation. The simulation environment is built inside this function, so it can
+    be used as the task of a worker process.
+    :param seed: seed for the random number generator
+    :param parameters: dict overriding DEFAULT_PARAMETERS
+    :return: dict with the seed and the costs of the factory
+    """
+    parameters = dict(DEFAULT_PARAMETERS, **(parameters or {}))
+    random.seed(seed)
+    env = simpy.Environment()
+    factory = build_factory(env, parameters)
+    env.run(until=parameters['simulation_time'])
+    stocks = [factory.module.stock] + [component.stock for component in factory.module.breakable_components]
+    return {
+        'seed': seed,
+        'costs': factory.costs,
+        'downtime_costs': sum(machine.total_downtime_costs for machine in factory.machines),
+        'purchase_costs': sum(stock.purchase_costs for stock in stocks),
+        'inventory_holding_costs': sum(stock.inventory_holding_costs for stock in stocks),
+        'salary_costs': factory.operators_salary + factory.maintenance_men_salary,
+    }
+
+
+def summarize(results):
+    """
+    Calculates the mean and the sample variance of the costs over replications
+    :param results: non-empty list of dicts as returned by run_one
+    :return: dict mapping every name in COSTS to a dict with its mean and variance
+    """
+    n = len(results)
+    if n < 1:
+        raise ValueError("cannot summarize zero replications")
+    summary = {}
+    for name in COSTS:
+        values = [result[name] for result in results]
+        mean = sum(values) / float(n)
+        variance = sum((value - mean) ** 2 for value in values) / (n - 1) if n > 1 else 0.0
+        summary[name] = {'mean': mean, 'variance': variance}
+    return summary
+
+
+def _map(function, tasks, processes):
+    """
+    Applies function to every task on a pool of worker processes
+    :param function: picklable function of one argument
+    :param tasks: list of arguments
+    :param processes: number of worker processes, defaults to the number of cores
+    :return: list of results in the order of tasks
+    """
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(function, tasks, max(1, len(tasks) // (processes * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _run_policy(task):
+    """
+    Runs a single replication of a policy
+    :param task: tuple of (policy, seed, parameters)
+    :return: tuple of (policy, dict as returned by run_one)
+    """
+    policy, seed, parameters = task
+    return policy, run_one(seed, dict(parameters or {}, **POLICIES[policy]))
+
+
+def run_replications(n, parameters=None, processes=None):
+    """
+    Runs n independent replications, seeded 0 to n - 1, spread over a pool of worker processes
+    :param n: number of replications
+    :param parameters: dict overriding DEFAULT_PARAMETERS
+    :param processes: number of worker processes, defaults to the number of cores
+    :return: dict as returned by summarize
+    """
+    if n < 1:
+        raise ValueError("number of replications must be at least 1, got %r" % n)
+    return summarize(_map(functools.partial(run_one, parameters=parameters), list(range(n)), processes))
+
+
+def evaluate_policies(n, parameters=None, processes=None):
+    """
+    Runs n replications, seeded 0 to n - 1, of every policy in POLICIES, spread over a single pool of worker processes
+    :param n: number of replications per policy
+    :param parameters: dict overriding DEFAULT_PARAMETERS, except for the replace_module flags set by the policy
+    :param processes: number of worker processes, defaults to the number of cores
+    :return: dict mapping every policy to a dict as returned by summarize
+    """
+    if n < 1:
+        raise ValueError("number of replications must be at least 1, got %r" % n)
+    tasks = [(policy, seed, parameters) for policy in sorted(POLICIES) for seed in range(n)]
+    results = dict((policy, []) for policy in POLICIES)
+    for policy, result in _map(_run_policy, tasks, processes):
+        results[policy].append(result)
+    return dict((policy, summarize(results[policy])) for policy in results)
@@ -1,18 +1,79 @@
 __author__ = 'Vincent van Bergen'
 
+import collections
+import math
 import simpy
-import sys
 import random
 
+_log1p = math.log1p
+_random = random.random
 
-class ComponentStock(simpy.Container):
+
+def _alias_table(weights):
+    """
+    Builds the tables of Walker's alias method, which samples from a discrete distribution in constant time
+    :param weights: list of non-negative weights, at least one of them positive
+    :return: tuple of (list of probabilities, list of aliases)
+    """
+    n = len(weights)
+    total = float(sum(weights))
+    scaled = [weight * n / total for weight in weights]
+    probabilities = [1.0] * n
+    aliases = list(range(n))
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+    return probabilities, aliases
+
+
+class StockGet(simpy.Event):
+    """
+    Event that is triggered once the requested amount has been taken from a ComponentStock
+    """
+
+    def __init__(self, stock, amount):
+        """
+        :param stock: the stock to take the items from
+        :param amount: the amount of stock requested
+        """
+        super(StockGet, self).__init__(stock.env)
+        self.stock = stock
+        self.amount = amount
+        if stock._waiters or not stock._do_get(self):
+            stock._waiters.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+
+    def cancel(self):
+        """
+        Withdraws the request if it has not been fulfilled yet
+        """
+        if not self.triggered:
+            self.stock._waiters.remove(self)
+
+
+class ComponentStock(object):
     """
-    Implementation of a (S-1,S) inventory management system
+    Implementation of a (S-1,S) inventory management system. The stock level is a plain counter, requests that cannot
+    be fulfilled wait in order of arrival until an order is delivered. A stock of unlimited capacity never runs out,
+    so it only accounts the purchase costs and does not schedule deliveries. get and put return events that can be
+    yielded. Unlike a simpy.Container put, a put does not wait for room: it fills the stock up to its capacity and
+    discards the surplus. An order that would overfill the stock is not placed, so no purchased item is discarded.
     """
-    purchase_costs = 0
-    inventory_holding_costs_saved = 0  # the amount saved
-    in_order = 0
-    last_order_at = 0
+    __slots__ = ('env', 'capacity', 'level', 'unlimited', 'unit_purchase_costs', 'delivery_time', 'unit_holding_costs',
+                 'purchase_costs', 'inventory_holding_costs_saved', 'in_order', 'last_order_at', '_waiters')
 
     def __init__(self, env, unit_purchase_costs, delivery_time, unit_holding_costs, capacity=float('inf')):
         """
@@ -20,13 +81,20 @@ class ComponentStock(simpy.Container):
         :param unit_purchase_costs: costs for purchasing one
         :param delivery_time: time between order and delivery
         :param unit_holding_costs: costs for holding one unit of stock for 1 time unit
-        :param capacity:
+        :param capacity: the S of the (S-1,S) policy, unlimited by default
         """
-        super(ComponentStock, self).__init__(env, capacity=capacity, init=capacity)
         self.env = env
+        self.capacity = capacity
+        self.level = capacity
+        self.unlimited = capacity == float('inf')
         self.unit_purchase_costs = unit_purchase_costs
         self.delivery_time = delivery_time
         self.unit_holding_costs = unit_holding_costs
+        self.purchase_costs = 0
+        self.inventory_holding_costs_saved = 0  # the amount saved
+        self.in_order = 0
+        self.last_order_at = 0
+        self._waiters = collections.deque()
 
     @property
     def inventory_holding_costs(self):
@@ -36,37 +104,149 @@ class ComponentStock(simpy.Container):
         return costs
 
     def get(self, amount):
-        return super(ComponentStock, self).get(amount)
+        """
+        :param amount: the amount of stock requested
+        :return: returns a StockGet event
+        """
+        return StockGet(self, amount)
+
+    def put(self, amount):
+        """
+        Adds items to the stock, up to its capacity, and hands them to the waiting requests
+        :param amount: the number of items to add
+        :return: returns an event that has already been triggered
+        """
+        self._put(amount)
+        event = self.env.event()
+        event.succeed()
+        return event
+
+    def _put(self, amount):
+        """
+        Adds items to the stock, up to its capacity, and hands them to the waiting requests
+        :param amount: the number of items to add
+        """
+        self.level = min(self.level + amount, self.capacity)
+        waiters = self._waiters
+        while waiters and self._do_get(waiters[0]):
+            waiters.popleft()
 
     def _do_get(self, event):
         """
-        :param amount: the amount of stock requested
-        :return: returns a ContainerGet event
+        Takes the requested amount from the stock and orders its replacement if enough is in stock
+        :param event: the StockGet event
+        :return: whether the request has been fulfilled
         """
-        if self._level >= event.amount:
+        if self.unlimited:
+            self.purchase_costs += event.amount * self.unit_purchase_costs
+            event.succeed()
+            return True
+        if self.level >= event.amount:
+            self.level -= event.amount
             self.last_order_at = self.env.now
-            self.env.process(self.order(event.amount))
+            self.order(event.amount)
             self.inventory_holding_costs_saved += (self.env.now - self.last_order_at) * (
                 self.capacity - event.amount) * self.unit_holding_costs
-            self._level -= event.amount
             event.succeed()
+            return True
+        return False
 
     def order(self, amount):
         """
-        A process to order an amount of items
+        Orders an amount of items. The delivery is a timeout event with a callback, so no process is started per order.
+        An order that would fill the stock beyond its capacity is not placed and not charged.
         :param amount: the number of items to order
+        :return: whether the order has been placed
         """
+        if self.level + self.in_order + amount > self.capacity:
+            return False
         self.in_order += amount
         self.purchase_costs += amount * self.unit_purchase_costs
-        yield self.env.timeout(self.delivery_time)
-        self.in_order -= amount
-        yield self.put(amount)
+        self.env.timeout(self.delivery_time, amount).callbacks.append(self._deliver)
+        return True
+
+    def _deliver(self, event):
+        """
+        Puts the items of an order in stock
+        :param event: the timeout event of the delivery, with the number of items as value
+        """
+        self.in_order -= event.value
+        self._put(event.value)
+
+
+class CrewRequest(simpy.Event):
+    """
+    Event that is triggered once a maintenance man of a MaintenanceCrew is assigned to the request
+    """
+
+    def __init__(self, crew):
+        """
+        :param crew: the crew to request a maintenance man from
+        """
+        super(CrewRequest, self).__init__(crew.env)
+        self.crew = crew
+        self.holds_man = False  # whether a maintenance man is assigned and not yet released
+        if crew.count < crew.capacity:
+            crew.count += 1
+            self.holds_man = True
+            self.succeed()
+        else:
+            crew._waiters.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.crew.release(self)
+
+
+class MaintenanceCrew(object):
+    """
+    A number of maintenance men who each work on one machine at a time. The number of busy men is a plain counter,
+    requests wait in order of arrival when all of them are busy.
+    """
+    __slots__ = ('env', 'capacity', 'count', '_waiters')
+
+    def __init__(self, env, capacity):
+        """
+        :param env: simulation environment
+        :param capacity: number of maintenance men
+        """
+        self.env = env
+        self.capacity = capacity
+        self.count = 0
+        self._waiters = collections.deque()
+
+    def request(self):
+        """
+        :return: returns a CrewRequest event
+        """
+        return CrewRequest(self)
+
+    def release(self, request):
+        """
+        Hands the maintenance man of a request over to the next waiting request, or withdraws a waiting request.
+        Releasing a request again has no effect, like for simpy.Resource.
+        :param request: the CrewRequest to release
+        """
+        if not request.holds_man:
+            if not request.triggered and request in self._waiters:
+                self._waiters.remove(request)
+            return
+        request.holds_man = False
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.holds_man = True
+            waiter.succeed()
+        else:
+            self.count -= 1
 
 
 class Component(object):
     """
     The specification of a part/module.
     """
+    __slots__ = ('env', 'time_replacement', 'stock')
 
     def __init__(self, env, time_replacement, stock):
         """
@@ -83,16 +263,16 @@ class Component(object):
         """
         A process which replaces this component by a new one
         """
-        with self.stock.get(1) as req:
-            yield req
-            yield self.env.timeout(self.time_replacement)
+        yield self.stock.get(1)
+        yield self.env.timeout(self.time_replacement)
 
 
 class BreakableComponent(Component):
     """
     A component that breaks down every once in a while
     """
-    times_broken = 0
+    __slots__ = ('name', 'mean', 'replace_module', 'times_broken', '_failure_times')
+    batch_size = 1024  # number of failure times drawn at once
 
     def __init__(self, env, name, time_replacement, stock, mean, replace_module):
         """
@@ -109,22 +289,32 @@ class BreakableComponent(Component):
         self.name = name
         self.mean = mean
         self.replace_module = replace_module
+        self.times_broken = 0
+        self._failure_times = []
 
     def time_to_failure(self):
         """
         Returns the time until next failure if this component, using the mean time to failure of this component.
+        Failure times are drawn in batches of batch_size to amortize the cost of the random number generator. A Module
+        whose components all have exponential lifetimes draws from its alias table instead, so this is only called when
+        a component overrides time_to_failure or when no component of the module can break.
         :return: float
         """
-        try:
-            return random.expovariate(1.0 / self.mean)
-        except ZeroDivisionError:
-            return sys.maxint
+        if not self._failure_times:
+            if not self.mean:
+                return float('inf')
+            scale = -self.mean
+            self._failure_times = [scale * _log1p(-_random()) for i in range(self.batch_size)]
+        return self._failure_times.pop()
 
 
 class Module(Component):
     """
-    A container for multiple breakable components
+    A container for multiple breakable components. The failure rates of the components are read once, when the module
+    is built: after changing the mean of a component or the list of components, call update_failure_rates, otherwise
+    the module keeps picking broken components with the old rates.
     """
+    __slots__ = ('breakable_components', '_alias_table', '_mean_time_to_failure')
 
     def __init__(self, env, time_replacement, stock, breakable_components):
         """
@@ -141,31 +331,63 @@ class Module(Component):
             stock.unit_holding_costs = 0
         super(Module, self).__init__(env, time_replacement, stock)
         self.breakable_components = breakable_components
+        self.update_failure_rates()
+
+    def update_failure_rates(self):
+        """
+        Builds the alias table from the current means of the breakable components, or clears it when a component does
+        not have exponential lifetimes or no component can break
+        """
+        self._alias_table = None
+        rates = [1.0 / component.mean if component.mean else 0.0 for component in self.breakable_components]
+        exponential = all(type(component).time_to_failure == BreakableComponent.time_to_failure
+                          for component in self.breakable_components)
+        if exponential and sum(rates) > 0:
+            self._alias_table = _alias_table(rates)
+            self._mean_time_to_failure = 1.0 / sum(rates)
 
     def run(self, machine):
         """
         Waits till first part gets broken and tells this to the machine
         :param machine: the machine which should be broken when this breaks
         """
-        while True:
-            if len(self.breakable_components) > 0:
-                broken_component, time = self.get_first_broken_component()
-                yield self.env.timeout(time)
-                broken_component.times_broken += 1
-                yield self.env.process(machine.repair(broken_component))
+        timeout = self.env.timeout
+        process = self.env.process
+        get_first_broken_component = self.get_first_broken_component
+        repair = machine.repair
+        while self.breakable_components:
+            broken_component, time = get_first_broken_component()
+            yield timeout(time)
+            broken_component.times_broken += 1
+            yield process(repair(broken_component))
 
     def get_first_broken_component(self):
-        return min([(component, component.time_to_failure()) for component in self.breakable_components],
-                   key=lambda result: result[1])
+        """
+        Returns the component that breaks first and the time until it breaks. For exponential lifetimes this time is
+        exponential with the sum of the failure rates, and the component is picked with probability proportional to its
+        rate, so a single draw and an alias table lookup replace a draw per component.
+        :return: tuple of (BreakableComponent, float)
+        """
+        if self._alias_table:
+            probabilities, aliases = self._alias_table
+            u = _random() * len(probabilities)
+            i = int(u)
+            if u - i >= probabilities[i]:
+                i = aliases[i]
+            return self.breakable_components[i], -self._mean_time_to_failure * _log1p(-_random())
+        first_broken_component, first_time = None, None
+        for component in self.breakable_components:
+            time = component.time_to_failure()
+            if first_broken_component is None or time < first_time:
+                first_broken_component, first_time = component, time
+        return first_broken_component, first_time
 
 
 class Machine(object):
     """
     A machine
     """
-    downtime_costs = 0
-    broken = False
-    broken_since = 0
+    __slots__ = ('factory', 'env', 'module', 'costs_per_unit_downtime', 'downtime_costs', 'broken', 'broken_since')
 
     def __init__(self, env, module, costs_per_unit_downtime, factory):
         """
@@ -179,6 +401,9 @@ class Machine(object):
         self.env = env
         self.module = module
         self.costs_per_unit_downtime = costs_per_unit_downtime
+        self.downtime_costs = 0
+        self.broken = False
+        self.broken_since = 0
         self.env.process(self.module.run(self))
 
     def repair(self, broken_component):
@@ -187,18 +412,13 @@ class Machine(object):
         """
         self.broken = True
         self.broken_since = self.env.now
+        component = self.module if broken_component.replace_module else broken_component
         if self.factory.maintenance_men:
             with self.factory.maintenance_men.request() as req:
                 yield req
-                if broken_component.replace_module:
-                    yield self.env.process(self.module.replace())
-                else:
-                    yield self.env.process(broken_component.replace())
+                yield self.env.process(component.replace())
         else:
-            if broken_component.replace_module:
-                yield self.env.process(self.module.replace())
-            else:
-                yield self.env.process(broken_component.replace())
+            yield self.env.process(component.replace())
         self.downtime_costs += (self.env.now - self.broken_since) * self.costs_per_unit_downtime
         self.broken = False
 
@@ -214,8 +434,6 @@ class Factory(object):
     """
     Factory consisting of multiple Machines, operators and maintenance men
     """
-    maintenance_men_salary = 0
-    operators_salary = 0
     maintenance_men = False
 
     def __init__(self, env, number_maintenance_men, module, costs_per_unit_downtime,
@@ -231,14 +449,31 @@ class Factory(object):
         """
         self.env = env
         if number_maintenance_men:
-            self.maintenance_men = simpy.Resource(self.env, number_maintenance_men)
-        env.process(self.track_salary())
+            self.maintenance_men = MaintenanceCrew(self.env, number_maintenance_men)
         self.machines = [Machine(env, module, costs_per_unit_downtime, self)
                          for i in range(number_of_machines)]
         self.operator_salary = operator_salary
         self.maintenance_man_salary = maintenance_man_salary
         self.module = module
 
+    @property
+    def maintenance_men_salary(self):
+        """
+        Salary paid to the maintenance men so far
+        :return: float
+        """
+        if not self.maintenance_men:
+            return 0
+        return self.maintenance_man_salary * self.maintenance_men.capacity * self.env.now
+
+    @property
+    def operators_salary(self):
+        """
+        Salary paid to the operators so far
+        :return: float
+        """
+        return self.operator_salary * len(self.machines) * self.env.now
+
     @property
     def costs(self):
         """
@@ -246,18 +481,8 @@ class Factory(object):
         :return:
         """
         costs = self.module.stock.purchase_costs + self.module.stock.inventory_holding_costs
-        costs += sum([machine.total_downtime_costs for machine in self.machines])
-        costs += sum([component.stock.purchase_costs + component.stock.inventory_holding_costs
-                      for component in self.module.breakable_components])
+        costs += sum(machine.total_downtime_costs for machine in self.machines)
+        costs += sum(component.stock.purchase_costs + component.stock.inventory_holding_costs
+                     for component in self.module.breakable_components)
         costs += self.operators_salary + self.maintenance_men_salary
         return costs
-
-    def track_salary(self):
-        """
-        A process which keeps track salary costs
-        """
-        while True:
-            if self.maintenance_men:
-                self.maintenance_men_salary += self.maintenance_man_salary * self.maintenance_men.capacity
-            self.operators_salary += self.operator_salary * len(self.machines)
-            yield self.env.timeout(1)
\ No newline at end of file
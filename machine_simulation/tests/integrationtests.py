@@ -1,8 +1,13 @@
 __author__ = 'vincent'
+import random
 import unittest
 
-from machine_simulation.simulation import *
-from machine_simulation.input import *
+import simpy
+
+from machine_simulation.simulation import Module, Factory
+from machine_simulation.input import CD, TRAB, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY
+from machine_simulation.parallel import run_one, run_replications, evaluate_policies, summarize, POLICIES, COSTS
+from machine_simulation.tests.testsimulation import stock_ab, part_a, part_b
 
 
 class IntegrationTest(unittest.TestCase):
@@ -17,11 +22,10 @@ class IntegrationTest(unittest.TestCase):
         """
         self.env = simpy.Environment()
         breakable_components = [
-            BreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 5, False),
-            BreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, True),
+            part_a(self.env, 5, False),
+            part_b(self.env, 5, True),
         ]
-        self.module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB),
-                             breakable_components)
+        self.module = Module(self.env, TRAB, stock_ab(self.env), breakable_components)
 
     def test_zero_maintenance_men(self):
         """
@@ -34,30 +38,29 @@ class IntegrationTest(unittest.TestCase):
 
 
 class TestRandomSeed(unittest.TestCase):
-    def test_random_seed(self):
+    def simulate(self, seed):
         """
-        Tests whether simulation results are the same for 2 simulations if a random seed is set
+        Runs a simulation of 1000 time units after seeding the random number generator
+        :param seed: seed for the random number generator
+        :return: the Factory after the run
         """
+        random.seed(seed)
         env = simpy.Environment()
         breakable_components = [
-            BreakableComponent(env, "Part A", TRA, ComponentStock(env, CA, LA, CHA, SA), 5, False),
-            BreakableComponent(env, "Part B", TRB, ComponentStock(env, CB, LB, CHB, SB), 5, False),
-        ]
-        self.module = Module(env, TRAB, ComponentStock(env, CAB, LAB, CHAB, SAB),
-                             breakable_components)
-        factory1 = Factory(env, 4, self.module, CD, 1, MAINTENANCE_MAN_SALARY, OPERATOR_SALARY)
-        time = 1000
-        env.run(until=time)
-        env = simpy.Environment()
-        breakable_components = [
-            BreakableComponent(env, "Part A", TRA, ComponentStock(env, CA, LA, CHA, SA), 5, False),
-            BreakableComponent(env, "Part B", TRB, ComponentStock(env, CB, LB, CHB, SB), 5, False),
+            part_a(env, 5, False),
+            part_b(env, 5, False),
         ]
-        self.module = Module(env, TRAB, ComponentStock(env, CAB, LAB, CHAB, SAB),
-                             breakable_components)
-        factory2 = Factory(env, 4, self.module, CD, 1, MAINTENANCE_MAN_SALARY, OPERATOR_SALARY)
-        time = 1000
-        env.run(until=time)
+        module = Module(env, TRAB, stock_ab(env), breakable_components)
+        factory = Factory(env, 4, module, CD, 1, MAINTENANCE_MAN_SALARY, OPERATOR_SALARY)
+        env.run(until=1000)
+        return factory
+
+    def test_random_seed(self):
+        """
+        Tests whether simulation results are the same for 2 simulations if a random seed is set
+        """
+        factory1 = self.simulate(1)
+        factory2 = self.simulate(1)
 
         self.assertEqual(factory1.module.stock.purchase_costs, factory2.module.stock.purchase_costs)
 
@@ -66,4 +69,46 @@ class TestRandomSeed(unittest.TestCase):
             self.assertEqual(component1.stock.purchase_costs,
                              factory2.module.breakable_components[index].stock.purchase_costs,
                              "%s %s" % (component1.name, factory2.module.breakable_components[index].name))
-            index += 1
\ No newline at end of file
+            index += 1
+
+
+class TestReplications(unittest.TestCase):
+    """
+    Tests running independent replications of the simulation
+    """
+    parameters = {'number_machines': 2, 'simulation_time': 200}
+
+    def test_run_one(self):
+        """
+        Tests whether a replication only depends on its seed
+        """
+        self.assertEqual(run_one(1, self.parameters), run_one(1, self.parameters))
+
+    def test_run_replications(self):
+        """
+        Tests whether the replications run in worker processes give the same summary as running them one by one
+        """
+        summary = run_replications(4, self.parameters, processes=2)
+        expected = summarize([run_one(seed, self.parameters) for seed in range(4)])
+        for name in COSTS:
+            self.assertAlmostEqual(summary[name]['mean'], expected[name]['mean'])
+            self.assertAlmostEqual(summary[name]['variance'], expected[name]['variance'])
+
+    def test_evaluate_policies(self):
+        """
+        Tests whether every policy is evaluated with its own replace_module flags
+        """
+        summaries = evaluate_policies(2, self.parameters, processes=2)
+        self.assertEqual(sorted(summaries), sorted(POLICIES))
+        for policy, flags in POLICIES.items():
+            parameters = dict(self.parameters, **flags)
+            expected = summarize([run_one(seed, parameters) for seed in range(2)])
+            self.assertAlmostEqual(summaries[policy]['costs']['mean'], expected['costs']['mean'])
+
+    def test_zero_replications(self):
+        """
+        Tests whether asking for zero replications is rejected before any simulation is run
+        """
+        self.assertRaises(ValueError, run_replications, 0, self.parameters, 2)
+        self.assertRaises(ValueError, evaluate_policies, 0, self.parameters, 2)
+        self.assertRaises(ValueError, summarize, [])
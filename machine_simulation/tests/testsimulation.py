@@ -1,6 +1,7 @@
 __author__ = 'Vincent van Bergen'
 
-from machine_simulation.simulation import *
+from machine_simulation.simulation import ComponentStock, BreakableComponent
+from machine_simulation.input import CA, CB, CAB, LA, LB, LAB, CHA, CHB, CHAB, SA, SB, SAB, TRA, TRB
 
 
 class TestBreakableComponent(BreakableComponent):
@@ -9,4 +10,29 @@ class TestBreakableComponent(BreakableComponent):
     """
     def time_to_failure(self):
         """Return time until next failure"""
-        return self.mean
\ No newline at end of file
+        return self.mean
+
+
+def stock_a(env):
+    """Return a new stock of part A with the parameters of input"""
+    return ComponentStock(env, CA, LA, CHA, SA)
+
+
+def stock_b(env):
+    """Return a new stock of part B with the parameters of input"""
+    return ComponentStock(env, CB, LB, CHB, SB)
+
+
+def stock_ab(env):
+    """Return a new stock of module AB with the parameters of input"""
+    return ComponentStock(env, CAB, LAB, CHAB, SAB)
+
+
+def part_a(env, mean, replace_module):
+    """Return a new part A with its own stock"""
+    return BreakableComponent(env, "Part A", TRA, stock_a(env), mean, replace_module)
+
+
+def part_b(env, mean, replace_module):
+    """Return a new part B with its own stock"""
+    return BreakableComponent(env, "Part B", TRB, stock_b(env), mean, replace_module)
@@ -1,10 +1,16 @@
 __author__ = 'Vincent van Bergen'
 
+import math
+import random
 import unittest
 
-from machine_simulation.simulation import *
-from testsimulation import TestBreakableComponent
-from machine_simulation.input import *
+import simpy
+
+from machine_simulation.simulation import ComponentStock, MaintenanceCrew, Module, Factory, _alias_table
+from machine_simulation.parallel import POLICIES
+from machine_simulation.tests.testsimulation import TestBreakableComponent, stock_a, stock_b, stock_ab, part_a, part_b
+from machine_simulation.input import (CA, CB, CD, CHA, CHB, LA, LB, MA, MB, TRA, TRB, TRAB, NUMBER_MAINTENANCE_MEN,
+                                      OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
 
 
 class TestComponentStock(unittest.TestCase):
@@ -47,6 +53,22 @@ class TestComponentStock(unittest.TestCase):
         self.assertEqual(self.stock.purchase_costs, 0)
 
 
+class TestUnlimitedComponentStock(unittest.TestCase):
+    def test_get(self):
+        """
+        Tests whether a stock of unlimited capacity accounts purchases without ordering
+        """
+        env = simpy.Environment()
+        stock = ComponentStock(env, 10, 10, 10)
+        stock.get(1)
+        stock.get(1)
+        env.run(until=1)
+        self.assertEqual(stock.level, float('inf'))
+        self.assertEqual(stock.in_order, 0)
+        self.assertEqual(stock.purchase_costs, 2 * stock.unit_purchase_costs)
+        self.assertEqual(stock.inventory_holding_costs, stock.unit_holding_costs * 1)
+
+
 class TestComponentStockBoundaryCases(unittest.TestCase):
     def setUp(self):
         self.env = simpy.Environment()
@@ -65,11 +87,36 @@ class TestComponentStockBoundaryCases(unittest.TestCase):
         self.assertEqual(self.stock.level, 0)
         self.assertEqual(self.stock.in_order, 1)
 
+    def test_cancel_waiting_request(self):
+        """
+        Tests whether a request which is withdrawn while waiting does not take the delivered item
+        """
+        self.stock.get(1)
+        with self.stock.get(1):
+            pass
+        self.env.run(until=self.stock.delivery_time + 1)
+        self.assertEqual(self.stock.level, 1)
+        self.assertEqual(self.stock.in_order, 0)
+
+    def test_put_full_stock(self):
+        """
+        Tests whether a put can be yielded and does not raise the level above the capacity
+        """
+        def deliver():
+            yield self.stock.put(1)
+
+        self.env.process(deliver())
+        self.env.run(until=1)
+        self.assertEqual(self.stock.level, self.stock.capacity)
+
     def test_order_full_stock(self):
         """
-        Tests whether an item is ordered when the stock is full. Succeeds when an item is indeed ordered.
+        Tests whether an order on a full stock is not placed, so nothing is charged or delivered, and whether the stock
+        is refilled after a get
         """
-        self.stock.order(1)
+        self.assertFalse(self.stock.order(1))
+        self.assertEqual(self.stock.in_order, 0)
+        self.assertEqual(self.stock.purchase_costs, 0)
         self.env.run(until=self.stock.delivery_time + 1)
         self.assertEqual(self.stock.level, 1)
         self.stock.get(1)
@@ -77,6 +124,60 @@ class TestComponentStockBoundaryCases(unittest.TestCase):
         self.assertEqual(self.stock.level, 1)
 
 
+class TestMaintenanceCrew(unittest.TestCase):
+    """
+    Tests whether MaintenanceCrew hands out at most capacity maintenance men at a time
+    """
+
+    def setUp(self):
+        self.env = simpy.Environment()
+        self.crew = MaintenanceCrew(self.env, 1)
+
+    def work(self, duration, finished):
+        with self.crew.request() as req:
+            yield req
+            yield self.env.timeout(duration)
+            finished.append(self.env.now)
+
+    def test_waiting_request(self):
+        """
+        Tests whether a request waits until the maintenance man is released
+        """
+        finished = []
+        self.env.process(self.work(2, finished))
+        self.env.process(self.work(3, finished))
+        self.env.run()
+        self.assertEqual(finished, [2, 5])
+        self.assertEqual(self.crew.count, 0)
+
+    def test_cancel_waiting_request(self):
+        """
+        Tests whether a withdrawn request does not get a maintenance man
+        """
+        self.crew.request()
+        with self.crew.request() as req:
+            self.assertFalse(req.triggered)
+        self.assertEqual(self.crew.count, 1)
+
+    def test_release_twice(self):
+        """
+        Tests whether releasing a request a second time neither frees another maintenance man nor hands one over
+        """
+        req = self.crew.request()
+        waiting = self.crew.request()
+        self.crew.release(req)
+        self.crew.release(req)
+        self.assertTrue(waiting.triggered)
+        self.assertEqual(self.crew.count, 1)
+        third = self.crew.request()
+        self.crew.release(waiting)
+        self.crew.release(waiting)
+        self.assertTrue(third.triggered)
+        self.crew.release(third)
+        self.crew.release(third)
+        self.assertEqual(self.crew.count, 0)
+
+
 class TestModule(unittest.TestCase):
     """
     Tests Module class
@@ -85,11 +186,11 @@ class TestModule(unittest.TestCase):
     def setUp(self):
         self.env = simpy.Environment()
         breakable_components = [
-            TestBreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 4, False),
-            TestBreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, False),
+            TestBreakableComponent(self.env, "Part A", TRA, stock_a(self.env), 4, False),
+            TestBreakableComponent(self.env, "Part B", TRB, stock_b(self.env), 5, False),
         ]
 
-        self.module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
+        self.module = Module(self.env, TRAB, stock_ab(self.env), breakable_components)
 
     def test_get_first_broken_component(self):
         """
@@ -102,6 +203,90 @@ class TestModule(unittest.TestCase):
         self.assertEqual(time, 4)
 
 
+class TestTimeToFailure(unittest.TestCase):
+    def test_zero_mean(self):
+        """
+        Tests whether a component with a zero mean time to failure never breaks
+        """
+        env = simpy.Environment()
+        component = part_a(env, 0, False)
+        self.assertEqual(component.time_to_failure(), float('inf'))
+
+    def test_batches(self):
+        """
+        Tests whether failure times are positive exponential draws, taken from the end of a batch, and whether a new
+        batch is drawn once the previous one is used up
+        """
+        env = simpy.Environment()
+        component = part_a(env, 5, False)
+        batch_size = component.batch_size
+        random.seed(1)
+        expected = [-5 * math.log1p(-random.random()) for i in range(2 * batch_size)]
+        random.seed(1)
+        drawn = [component.time_to_failure() for i in range(batch_size)]
+        self.assertEqual(component._failure_times, [])
+        drawn.append(component.time_to_failure())
+        self.assertEqual(len(component._failure_times), batch_size - 1)
+        self.assertTrue(all(time > 0 for time in drawn))
+        self.assertEqual(drawn, expected[batch_size - 1::-1] + [expected[-1]])
+
+
+class TestAliasTable(unittest.TestCase):
+    """
+    Tests the alias method used to pick the component that breaks first
+    """
+
+    def assertDistribution(self, weights):
+        probabilities, aliases = _alias_table(weights)
+        n = len(weights)
+        drawn = [0.0] * n
+        for i in range(n):
+            drawn[i] += probabilities[i] / n
+            drawn[aliases[i]] += (1 - probabilities[i]) / n
+        for weight, probability in zip(weights, drawn):
+            self.assertAlmostEqual(probability, weight / float(sum(weights)))
+
+    def test_distribution(self):
+        """
+        Tests whether every index is drawn with probability proportional to its weight
+        """
+        self.assertDistribution([1.0 / MA, 1.0 / MB])
+        self.assertDistribution([1, 2, 3, 4])
+        self.assertDistribution([0, 1, 0])
+
+    def test_exponential_module(self):
+        """
+        Tests whether a module with exponential components only draws a single failure time
+        """
+        env = simpy.Environment()
+        breakable_components = [
+            part_a(env, MA, False),
+            part_b(env, MB, False),
+        ]
+        module = Module(env, TRAB, stock_ab(env), breakable_components)
+        broken_component, time = module.get_first_broken_component()
+        self.assertIn(broken_component, breakable_components)
+        self.assertGreater(time, 0)
+        for component in breakable_components:
+            self.assertEqual(component._failure_times, [])
+
+    def test_update_failure_rates(self):
+        """
+        Tests whether a changed mean is used once the failure rates of the module are updated
+        """
+        env = simpy.Environment()
+        breakable_components = [
+            part_a(env, MA, False),
+            part_b(env, MB, False),
+        ]
+        module = Module(env, TRAB, stock_ab(env), breakable_components)
+        breakable_components[0].mean = 0
+        module.update_failure_rates()
+        for i in range(100):
+            broken_component, time = module.get_first_broken_component()
+            self.assertEqual(broken_component, breakable_components[1])
+
+
 class TestDowntimeCosts(unittest.TestCase):
     def setUp(self):
         self.env = simpy.Environment()
@@ -110,7 +295,7 @@ class TestDowntimeCosts(unittest.TestCase):
             TestBreakableComponent(self.env, "Part B", 2, ComponentStock(self.env, CB, LB, CHB, 1000), 5, False),
         ]
         self.downtime_costs = CD
-        module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
+        module = Module(self.env, TRAB, stock_ab(self.env), breakable_components)
         self.factory = Factory(self.env, 0, module, self.downtime_costs, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
         self.part_a = breakable_components[0]
         self.machine = self.factory.machines[0]
@@ -131,26 +316,62 @@ class TestDowntimeCosts(unittest.TestCase):
                          (self.part_a.time_replacement - 1) * self.machine.costs_per_unit_downtime)
 
 
+class TestSalaries(unittest.TestCase):
+    def setUp(self):
+        self.env = simpy.Environment()
+        breakable_components = [
+            TestBreakableComponent(self.env, "Part A", 2, stock_a(self.env), 4, False),
+            TestBreakableComponent(self.env, "Part B", 2, stock_b(self.env), 5, False),
+        ]
+        self.number_maintenance_men = 2
+        self.number_of_machines = 3
+        self.module = Module(self.env, TRAB, stock_ab(self.env), breakable_components)
+        self.factory = Factory(self.env, self.number_maintenance_men, self.module, CD, self.number_of_machines,
+                               OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
+
+    def test_salaries(self):
+        """
+        Tests whether operators and maintenance men are paid their salary per unit of time, and whether the salaries are
+        part of the costs of the factory
+        """
+        time = 1000
+        self.env.run(until=time)
+        self.assertEqual(self.factory.operators_salary, OPERATOR_SALARY * self.number_of_machines * time)
+        self.assertEqual(self.factory.maintenance_men_salary,
+                         MAINTENANCE_MAN_SALARY * self.number_maintenance_men * time)
+        stocks = [self.module.stock] + [component.stock for component in self.module.breakable_components]
+        costs = sum(stock.purchase_costs + stock.inventory_holding_costs for stock in stocks)
+        costs += sum(machine.total_downtime_costs for machine in self.factory.machines)
+        costs += OPERATOR_SALARY * self.number_of_machines * time
+        costs += MAINTENANCE_MAN_SALARY * self.number_maintenance_men * time
+        self.assertAlmostEqual(self.factory.costs, costs)
+
+
 class TestPolicies(unittest.TestCase):
     """
-    Tests Machine class
+    Tests Machine class. The four policies run side by side in a single environment, which is simulated once for all
+    tests.
     """
-
-    def setUp(self):
-        self.env = simpy.Environment()
+    @classmethod
+    def setUpClass(cls):
+        env = simpy.Environment()
+        cls.modules = {}
+        for policy, flags in POLICIES.items():
+            breakable_components = [
+                part_a(env, 5, flags['replace_module_a']),
+                part_b(env, 5, flags['replace_module_b']),
+            ]
+            module = Module(env, TRAB, stock_ab(env), breakable_components)
+            Factory(env, NUMBER_MAINTENANCE_MEN, module, CD, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
+            cls.modules[policy] = module
+        time = 1000
+        env.run(until=time)
 
     def test_policy_o(self):
         """
         Tests situation where part always gets replaced
         """
-        breakable_components = [
-            BreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 5, False),
-            BreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, False),
-        ]
-        module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
-        Factory(self.env, NUMBER_MAINTENANCE_MEN, module, CD, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
-        time = 1000
-        self.env.run(until=time)
+        module = self.modules['o']
         self.assertEqual(module.stock.purchase_costs, 0)
         for component in module.breakable_components:
             self.assertNotEqual(component.stock.purchase_costs, 0)
@@ -159,14 +380,7 @@ class TestPolicies(unittest.TestCase):
         """
         Tests situation where module is replaced when first part is broken
         """
-        breakable_components = [
-            BreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 5, True),
-            BreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, False),
-        ]
-        module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
-        Factory(self.env, NUMBER_MAINTENANCE_MEN, module, CD, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
-        time = 1000
-        self.env.run(until=time)
+        module = self.modules['a']
         self.assertNotEqual(module.stock.purchase_costs, 0)
         self.assertNotEqual(module.breakable_components[1].stock.purchase_costs, 0)
         self.assertEqual(module.breakable_components[0].stock.purchase_costs, 0)
@@ -175,14 +389,7 @@ class TestPolicies(unittest.TestCase):
         """
         Tests situation where module is replaced when second part is broken
         """
-        breakable_components = [
-            BreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 5, False),
-            BreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, True),
-        ]
-        module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
-        Factory(self.env, NUMBER_MAINTENANCE_MEN, module, CD, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
-        time = 1000
-        self.env.run(until=time)
+        module = self.modules['b']
         self.assertNotEqual(module.stock.purchase_costs, 0)
         self.assertNotEqual(module.breakable_components[0].stock.purchase_costs, 0)
         self.assertEqual(module.breakable_components[1].stock.purchase_costs, 0)
@@ -191,14 +398,7 @@ class TestPolicies(unittest.TestCase):
         """
         Tests situation where module is always replaced
         """
-        breakable_components = [
-            BreakableComponent(self.env, "Part A", TRA, ComponentStock(self.env, CA, LA, CHA, SA), 5, True),
-            BreakableComponent(self.env, "Part B", TRB, ComponentStock(self.env, CB, LB, CHB, SB), 5, True),
-        ]
-        module = Module(self.env, TRAB, ComponentStock(self.env, CAB, LAB, CHAB, SAB), breakable_components)
-        Factory(self.env, NUMBER_MAINTENANCE_MEN, module, CD, 1, OPERATOR_SALARY, MAINTENANCE_MAN_SALARY)
-        time = 1000
-        self.env.run(until=time)
+        module = self.modules['c']
         self.assertNotEqual(module.stock.purchase_costs, 0)
         self.assertEqual(module.breakable_components[0].stock.purchase_costs, 0)
         self.assertEqual(module.breakable_components[1].stock.purchase_costs, 0)